@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import hashlib
-import json
+import queue
 import sqlite3
 import threading
+import time
 import uuid
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+import orjson
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from backend.scrapers.bayer_ua_dekalb import BayerUADekalbScraper
@@ -18,9 +23,16 @@ from backend.scrapers.bayer_ua_dekalb import BayerUADekalbScraper
 ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
 DB_PATH = DATA_DIR / "catalog.db"
+HTTP_CACHE_PATH = DATA_DIR / "http_cache.db"
+CATALOG_STREAM_BATCH = 1000
+CATALOG_STREAM_CHUNK = 64 * 1024
+CATALOG_CONN_POOL_SIZE = 4
+CONTENT_HASH_SIZE = 16
+RUN_PERSIST_INTERVAL = 0.5
+RUN_PERSIST_EVERY = 20
 FALLBACK_PATH = ROOT / "frontend" / "public" / "catalog_fallback.json"
 
-app = FastAPI(title="Parostok Catalog API")
+app = FastAPI(title="Parostok Catalog API", default_response_class=ORJSONResponse)
 
 
 class UpdateRequest(BaseModel):
@@ -41,21 +53,66 @@ class SourceStatus:
 
 RUNS: dict[str, dict[str, Any]] = {}
 LOCK = threading.Lock()
+_TLS = threading.local()
+_CONN_POOL: queue.Queue[sqlite3.Connection] = queue.Queue(maxsize=CATALOG_CONN_POOL_SIZE)
 
 
 def utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def get_conn() -> sqlite3.Connection:
+def _open_conn(check_same_thread: bool = True) -> sqlite3.Connection:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA busy_timeout=3000")
     return conn
 
 
+@contextmanager
+def get_conn() -> Iterator[sqlite3.Connection]:
+    conn = getattr(_TLS, "conn", None)
+    if conn is None:
+        conn = _open_conn()
+        _TLS.conn = conn
+    with conn:
+        yield conn
+
+
+def _borrow_conn() -> sqlite3.Connection:
+    try:
+        return _CONN_POOL.get_nowait()
+    except queue.Empty:
+        return _open_conn(check_same_thread=False)
+
+
+def _return_conn(conn: sqlite3.Connection) -> None:
+    try:
+        _CONN_POOL.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def content_hash(attrs: Iterable[tuple[Any, Any, Any]]) -> str:
+    h = hashlib.blake2b(digest_size=CONTENT_HASH_SIZE, usedforsecurity=False)
+    for key, value, evidence in sorted((key, str(value), evidence or "") for key, value, evidence in attrs):
+        h.update(key.encode("utf-8"))
+        h.update(b"\0")
+        h.update(value.encode("utf-8"))
+        h.update(b"\0")
+        h.update(evidence.encode("utf-8"))
+        h.update(b"\1")
+    return h.hexdigest()
+
+
 def init_db() -> None:
     with get_conn() as conn:
+        if str(DB_PATH) != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
         conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS hybrids(
@@ -67,6 +124,7 @@ def init_db() -> None:
               source_url TEXT NOT NULL,
               last_seen TEXT NOT NULL,
               last_updated TEXT NOT NULL,
+              content_hash TEXT,
               UNIQUE(name, market, source_url)
             );
             CREATE TABLE IF NOT EXISTS attributes(
@@ -89,8 +147,29 @@ def init_db() -> None:
               logs_json TEXT NOT NULL,
               counts_json TEXT NOT NULL
             );
+            CREATE INDEX IF NOT EXISTS ix_attributes_hybrid_id ON attributes(hybrid_id);
+            CREATE INDEX IF NOT EXISTS ix_hybrids_crop_name ON hybrids(crop, name);
+            CREATE INDEX IF NOT EXISTS ix_runs_started_at ON runs(started_at DESC);
             """
         )
+        columns = {r["name"] for r in conn.execute("SELECT name FROM pragma_table_info('hybrids')")}
+        if "content_hash" not in columns:
+            conn.execute("ALTER TABLE hybrids ADD COLUMN content_hash TEXT")
+        stale: dict[int, list[tuple[Any, Any, Any]]] = {
+            r["id"]: []
+            for r in conn.execute(
+                "SELECT id FROM hybrids WHERE content_hash IS NULL OR length(content_hash) != ?",
+                (CONTENT_HASH_SIZE * 2,),
+            )
+        }
+        if stale:
+            for r in conn.execute("SELECT hybrid_id, key, value, evidence FROM attributes"):
+                if r["hybrid_id"] in stale:
+                    stale[r["hybrid_id"]].append((r["key"], r["value"], r["evidence"]))
+            conn.executemany(
+                "UPDATE hybrids SET content_hash=? WHERE id=?",
+                [(content_hash(attrs), hybrid_id) for hybrid_id, attrs in stale.items()],
+            )
 
 
 def source_registry() -> list[SourceStatus]:
@@ -123,37 +202,73 @@ def source_registry() -> list[SourceStatus]:
     ]
 
 
+HYBRID_FIELDS = ("id", "name", "brand", "market", "source_url", "last_seen", "last_updated")
+ATTRIBUTE_FIELDS = ("key", "value", "evidence", "evidence_hash", "selector", "source_url", "extracted_at")
+CATALOG_QUERY = f"""
+    SELECT h.crop, {", ".join(f"h.{f}" for f in HYBRID_FIELDS)},
+           {", ".join(f"a.{f} AS attr_{f}" for f in ATTRIBUTE_FIELDS)}
+    FROM hybrids h LEFT JOIN attributes a ON a.hybrid_id=h.id
+    ORDER BY h.crop, h.name, h.id, a.id
+"""
+
+
+def iter_catalog(cur: sqlite3.Cursor) -> Iterator[tuple[str, dict[str, Any]]]:
+    crop = ""
+    hybrid: dict[str, Any] | None = None
+    while rows := cur.fetchmany(CATALOG_STREAM_BATCH):
+        for r in rows:
+            if hybrid is None or hybrid["id"] != r["id"]:
+                if hybrid is not None:
+                    yield crop, hybrid
+                crop = r["crop"]
+                hybrid = {f: r[f] for f in HYBRID_FIELDS}
+                hybrid["attributes"] = []
+            if r["attr_key"] is not None:
+                hybrid["attributes"].append({f: r[f"attr_{f}"] for f in ATTRIBUTE_FIELDS})
+    if hybrid is not None:
+        yield crop, hybrid
+
+
 def read_catalog() -> dict[str, Any]:
+    out: dict[str, list[dict[str, Any]]] = {}
     with get_conn() as conn:
-        hybrids = conn.execute("SELECT * FROM hybrids ORDER BY crop, name").fetchall()
-        out: dict[str, list[dict[str, Any]]] = {}
-        for h in hybrids:
-            attrs = conn.execute(
-                "SELECT key, value, evidence, evidence_hash, selector, source_url, extracted_at FROM attributes WHERE hybrid_id=?",
-                (h["id"],),
-            ).fetchall()
-            out.setdefault(h["crop"], []).append(
-                {
-                    "id": h["id"],
-                    "name": h["name"],
-                    "brand": h["brand"],
-                    "market": h["market"],
-                    "source_url": h["source_url"],
-                    "last_seen": h["last_seen"],
-                    "last_updated": h["last_updated"],
-                    "attributes": [dict(a) for a in attrs],
-                }
-            )
-        return {"crops": out}
+        for crop, hybrid in iter_catalog(conn.execute(CATALOG_QUERY)):
+            out.setdefault(crop, []).append(hybrid)
+    return {"crops": out}
+
+
+def stream_catalog(conn: sqlite3.Connection, cur: sqlite3.Cursor) -> Iterator[bytes]:
+    try:
+        buf = bytearray(b'{"crops":{')
+        crop: str | None = None
+        for hybrid_crop, hybrid in iter_catalog(cur):
+            if hybrid_crop != crop:
+                if crop is not None:
+                    buf += b"],"
+                buf += orjson.dumps(hybrid_crop) + b":["
+                crop = hybrid_crop
+            else:
+                buf += b","
+            buf += orjson.dumps(hybrid)
+            if len(buf) >= CATALOG_STREAM_CHUNK:
+                yield bytes(buf)
+                buf.clear()
+        if crop is not None:
+            buf += b"]"
+        buf += b"}}"
+        yield bytes(buf)
+    finally:
+        cur.close()
+        _return_conn(conn)
 
 
 def write_fallback() -> None:
     FALLBACK_PATH.parent.mkdir(parents=True, exist_ok=True)
-    FALLBACK_PATH.write_text(json.dumps(read_catalog(), indent=2), encoding="utf-8")
+    FALLBACK_PATH.write_bytes(orjson.dumps(read_catalog(), option=orjson.OPT_INDENT_2))
 
 
 def persist_run(job_id: str, run: dict[str, Any]) -> None:
-    with get_conn() as conn:
+    with LOCK, get_conn() as conn:
         conn.execute(
             """INSERT OR REPLACE INTO runs(job_id, started_at, finished_at, status, logs_json, counts_json)
                VALUES(?,?,?,?,?,?)""",
@@ -162,8 +277,8 @@ def persist_run(job_id: str, run: dict[str, Any]) -> None:
                 run["started_at"],
                 run.get("finished_at"),
                 run["status"],
-                json.dumps(run["step_logs"]),
-                json.dumps(run["counts"]),
+                orjson.dumps(run["step_logs"]).decode(),
+                orjson.dumps(run["counts"]).decode(),
             ),
         )
 
@@ -172,10 +287,18 @@ def run_update(job_id: str, req: UpdateRequest) -> None:
     with LOCK:
         run = RUNS[job_id]
     logs = run["step_logs"]
+    last_persist = 0.0
+    pending = 0
 
     def log(msg: str) -> None:
+        nonlocal last_persist, pending
         logs.append({"time": utc_now(), "message": msg})
-        persist_run(job_id, run)
+        pending += 1
+        now = time.monotonic()
+        if pending >= RUN_PERSIST_EVERY or now - last_persist >= RUN_PERSIST_INTERVAL:
+            persist_run(job_id, run)
+            last_persist = now
+            pending = 0
 
     log("Starting catalog sync job.")
     enabled_sources = [s for s in source_registry() if s.id in req.sources and s.enabled]
@@ -199,8 +322,11 @@ def run_update(job_id: str, req: UpdateRequest) -> None:
             continue
         try:
             log("Fetching bayer_ua_dekalb start page.")
-            scraper = BayerUADekalbScraper()
-            result = scraper.run()
+            scraper = BayerUADekalbScraper(cache_path=HTTP_CACHE_PATH)
+            try:
+                result = scraper.run()
+            finally:
+                scraper.close()
             run["counts"]["discovered"] += len(result["product_urls"])
             log(f"Discovered catalog pages: {len(result['catalog_urls'])}")
             log(f"Discovered product pages: {len(result['product_urls'])}")
@@ -234,8 +360,14 @@ def startup() -> None:
 
 
 @app.get("/api/catalog")
-def get_catalog() -> dict[str, Any]:
-    return read_catalog()
+def get_catalog() -> StreamingResponse:
+    conn = _borrow_conn()
+    try:
+        cur = conn.execute(CATALOG_QUERY)
+    except Exception:
+        _return_conn(conn)
+        raise
+    return StreamingResponse(stream_catalog(conn, cur), media_type="application/json")
 
 
 @app.post("/api/catalog/update")
@@ -265,10 +397,10 @@ def get_update(job_id: str) -> dict[str, Any]:
                 return {"status": "not_found", "step_logs": [], "counts": {}}
             return {
                 "status": row["status"],
-                "step_logs": json.loads(row["logs_json"]),
+                "step_logs": orjson.loads(row["logs_json"]),
                 "started_at": row["started_at"],
                 "finished_at": row["finished_at"],
-                "counts": json.loads(row["counts_json"]),
+                "counts": orjson.loads(row["counts_json"]),
             }
     return run
 
@@ -284,7 +416,7 @@ def get_sources() -> dict[str, Any]:
                 "status": row["status"],
                 "started_at": row["started_at"],
                 "finished_at": row["finished_at"],
-                "counts": json.loads(row["counts_json"]),
+                "counts": orjson.loads(row["counts_json"]),
             }
     return {"sources": [s.__dict__ for s in source_registry()], "latest_run": latest_run}
 
@@ -296,80 +428,72 @@ class ManualImportPayload(BaseModel):
 @app.post("/api/catalog/manual-import")
 def manual_import(payload: ManualImportPayload) -> dict[str, int]:
     counts = upsert_items(payload.items)
+    write_fallback()
     return {"added": counts["added"]}
 
 
 def upsert_items(items: list[dict[str, Any]]) -> dict[str, int]:
     counts = {"added": 0, "updated": 0, "unchanged": 0}
-    with get_conn() as conn:
+    with LOCK, get_conn() as conn:
+        conn.execute("BEGIN")
         for item in items:
             now = utc_now()
+            attrs = item.get("attributes", [])
+            new_hash = content_hash((a.get("key"), a.get("value"), a.get("evidence")) for a in attrs)
             existing = conn.execute(
-                "SELECT id FROM hybrids WHERE name=? AND market=? AND source_url=?",
+                "SELECT id, content_hash FROM hybrids WHERE name=? AND market=? AND source_url=?",
                 (item["name"], item["market"], item["source_url"]),
             ).fetchone()
-            had_existing = existing is not None
-
-            cur = conn.execute(
-                """INSERT OR IGNORE INTO hybrids(crop, name, brand, market, source_url, last_seen, last_updated)
-                   VALUES(?,?,?,?,?,?,?)""",
-                (
-                    item["crop"],
-                    item["name"],
-                    item.get("brand"),
-                    item["market"],
-                    item["source_url"],
-                    now,
-                    now,
-                ),
-            )
-            if cur.rowcount:
-                counts["added"] += 1
-            hybrid_id = conn.execute(
-                "SELECT id FROM hybrids WHERE name=? AND market=? AND source_url=?",
-                (item["name"], item["market"], item["source_url"]),
-            ).fetchone()[0]
 
-            attrs = item.get("attributes", [])
-            fingerprint = json.dumps(
-                sorted((a.get("key"), str(a.get("value")), a.get("evidence", "")) for a in attrs),
-                ensure_ascii=False,
-            )
-            new_hash = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
-            existing_rows = conn.execute(
-                "SELECT key, value, evidence FROM attributes WHERE hybrid_id=?",
-                (hybrid_id,),
-            ).fetchall()
-            existing_fingerprint = json.dumps(
-                sorted((r["key"], str(r["value"]), r["evidence"] or "") for r in existing_rows),
-                ensure_ascii=False,
-            )
-            existing_hash = hashlib.sha256(existing_fingerprint.encode("utf-8")).hexdigest()
-
-            if had_existing and new_hash == existing_hash:
+            if existing is not None and existing["content_hash"] == new_hash:
                 counts["unchanged"] += 1
-                conn.execute("UPDATE hybrids SET last_seen=? WHERE id=?", (now, hybrid_id))
+                conn.execute("UPDATE hybrids SET last_seen=? WHERE id=?", (now, existing["id"]))
                 continue
 
-            if had_existing:
+            if existing is not None:
                 counts["updated"] += 1
-            conn.execute("UPDATE hybrids SET last_seen=?, last_updated=? WHERE id=?", (now, now, hybrid_id))
-            conn.execute("DELETE FROM attributes WHERE hybrid_id=?", (hybrid_id,))
-            for attr in item.get("attributes", []):
-                evidence = attr.get("evidence", "")
+                hybrid_id = existing["id"]
                 conn.execute(
-                    """INSERT INTO attributes(hybrid_id, key, value, evidence, evidence_hash, selector, source_url, extracted_at)
-                       VALUES(?,?,?,?,?,?,?,?)""",
+                    "UPDATE hybrids SET last_seen=?, last_updated=?, content_hash=? WHERE id=?",
+                    (now, now, new_hash, hybrid_id),
+                )
+                conn.execute("DELETE FROM attributes WHERE hybrid_id=?", (hybrid_id,))
+            else:
+                counts["added"] += 1
+                hybrid_id = conn.execute(
+                    """INSERT INTO hybrids(crop, name, brand, market, source_url, last_seen, last_updated, content_hash)
+                       VALUES(?,?,?,?,?,?,?,?)
+                       RETURNING id""",
+                    (
+                        item["crop"],
+                        item["name"],
+                        item.get("brand"),
+                        item["market"],
+                        item["source_url"],
+                        now,
+                        now,
+                        new_hash,
+                    ),
+                ).fetchone()[0]
+
+            rows = []
+            for attr in attrs:
+                evidence = attr.get("evidence", "")
+                rows.append(
                     (
                         hybrid_id,
                         attr["key"],
                         attr.get("value"),
                         evidence,
-                        hashlib.sha256(evidence.encode("utf-8")).hexdigest() if evidence else None,
+                        hashlib.sha256(evidence.encode("utf-8"), usedforsecurity=False).hexdigest() if evidence else None,
                         attr.get("selector"),
                         attr.get("source_url", item["source_url"]),
                         attr.get("extracted_at", now),
-                    ),
+                    )
                 )
-    write_fallback()
+            conn.executemany(
+                """INSERT INTO attributes(hybrid_id, key, value, evidence, evidence_hash, selector, source_url, extracted_at)
+                   VALUES(?,?,?,?,?,?,?,?)""",
+                rows,
+            )
     return counts
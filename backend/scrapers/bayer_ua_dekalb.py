@@ -1,42 +1,142 @@
 from __future__ import annotations
 
+import functools
+import random
 import re
-from dataclasses import dataclass
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Any
-from urllib.parse import urljoin, urlparse
-from urllib.request import Request, urlopen
+from urllib.parse import urlparse
 
+import lxml.etree
+import lxml.html
+import requests
 from bs4 import BeautifulSoup
 
+_NBSP_TRANS = str.maketrans({"\u00a0": " "})
+_WS = re.compile(r"\s+")
+_BLANK_LINES = re.compile(r"\n{2,}")
+_FAO = re.compile(r"ФАО:\s*([0-9]{2,4})", re.IGNORECASE | re.MULTILINE)
+_GRAIN_TYPE = re.compile(r"Тип зерна:\s*([^\n]+)", re.IGNORECASE | re.MULTILINE)
+_MATURITY = re.compile(r"Група стиглості:\s*([^\n]+)", re.IGNORECASE | re.MULTILINE)
+_RATING = re.compile(r"^(.*?)(\d{1,2})$")
+_BULLETS = re.compile(r"[●○•\.\-]+")
+_SITE = r"https?://www\.cropscience\.bayer\.ua"
+_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+_DEKALB_HREFS = lxml.etree.XPath('//a[contains(@href, "/Products/Dekalb/")]/@href')
+_CATALOG_URL = re.compile(rf"{_SITE}/Products/Dekalb/[^/?#]+\Z")
+
+
+@functools.lru_cache(maxsize=32)
+def _block_pattern(heading: str) -> re.Pattern[str]:
+    h = re.escape(heading)
+    return re.compile(rf"{h}\s+(.*?)(?=\n[A-ZА-ЯІЇЄҐ0-9 \-]{{5,}}\n|\Z)", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=32)
+def _product_url_pattern(path_prefix: str) -> re.Pattern[str]:
+    return re.compile(rf"{_SITE}{re.escape(path_prefix)}.+\Z")
+
 
 @dataclass
 class BayerUADekalbScraper:
     market: str = "UA"
     start_url: str = "https://www.cropscience.bayer.ua/Products/Dekalb"
     brand: str = "DEKALB (Bayer)"
+    max_workers: int = 4
+    max_per_host: int = 2
+    min_delay: float = 0.5
+    max_delay: float = 1.5
+    cache_path: Path | None = None
+    _session: requests.Session = field(init=False, repr=False)
+    _cache: sqlite3.Connection | None = field(default=None, init=False, repr=False)
+    _cache_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _host_slots: dict[str, threading.Semaphore] = field(default_factory=dict, init=False, repr=False)
+    _host_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
 
-    def fetch(self, url: str) -> str:
-        req = Request(
-            url,
-            headers={
+    def __post_init__(self) -> None:
+        self._session = requests.Session()
+        self._session.headers.update(
+            {
                 "User-Agent": "Mozilla/5.0 (compatible; ParostokBot/1.0)",
                 "Accept-Language": "uk-UA,uk;q=0.9,en;q=0.8",
-            },
+            }
         )
-        with urlopen(req, timeout=30) as resp:
-            return resp.read().decode("utf-8", errors="ignore")
+        if self.cache_path is not None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._cache = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._cache.execute("PRAGMA journal_mode=WAL")
+            self._cache.execute(
+                """CREATE TABLE IF NOT EXISTS http_cache(
+                     url TEXT PRIMARY KEY,
+                     etag TEXT,
+                     last_modified TEXT,
+                     body BLOB NOT NULL
+                   )"""
+            )
+
+    def close(self) -> None:
+        self._session.close()
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.Semaphore(self.max_per_host)
+            return slot
+
+    def fetch(self, url: str) -> str:
+        cached = None
+        headers: dict[str, str] = {}
+        if self._cache is not None:
+            with self._cache_lock:
+                cached = self._cache.execute(
+                    "SELECT etag, last_modified, body FROM http_cache WHERE url=?", (url,)
+                ).fetchone()
+            if cached is not None:
+                if cached[0]:
+                    headers["If-None-Match"] = cached[0]
+                if cached[1]:
+                    headers["If-Modified-Since"] = cached[1]
+
+        with self._host_slot(url):
+            time.sleep(random.uniform(self.min_delay, self.max_delay))
+            resp = self._session.get(url, headers=headers, timeout=30)
+        if resp.status_code == 304 and cached is not None:
+            return cached[2].decode("utf-8", errors="ignore")
+        resp.raise_for_status()
+
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if self._cache is not None and (etag or last_modified):
+            with self._cache_lock, self._cache:
+                self._cache.execute(
+                    "INSERT OR REPLACE INTO http_cache(url, etag, last_modified, body) VALUES(?,?,?,?)",
+                    (url, etag, last_modified, resp.content),
+                )
+        elif self._cache is not None and cached is not None:
+            with self._cache_lock, self._cache:
+                self._cache.execute("DELETE FROM http_cache WHERE url=?", (url,))
+        return resp.content.decode("utf-8", errors="ignore")
 
     @staticmethod
     def _clean(s: str) -> str:
-        return re.sub(r"\s+", " ", s).strip()
+        return _WS.sub(" ", s).strip()
 
-    def _find_first(self, pattern: str, text: str) -> str | None:
-        m = re.search(pattern, text, flags=re.IGNORECASE | re.MULTILINE)
+    def _find_first(self, pattern: re.Pattern[str], text: str) -> str | None:
+        m = pattern.search(text)
         return m.group(1).strip() if m else None
 
     def _find_block(self, after_heading: str, text: str) -> str | None:
-        h = re.escape(after_heading)
-        m = re.search(rf"{h}\s+(.*?)(?=\n[A-ZА-ЯІЇЄҐ0-9 \-]{{5,}}\n|\Z)", text, flags=re.DOTALL)
+        m = _block_pattern(after_heading).search(text)
         return self._clean(m.group(1)) if m else None
 
     def _parse_kv_lines(self, block: str) -> dict[str, str]:
@@ -60,65 +160,45 @@ class BayerUADekalbScraper:
             return ratings
         for line in block.split("\n"):
             line = self._clean(line)
-            m = re.match(r"^(.*?)(\d{1,2})$", line)
+            m = _RATING.match(line)
             if not m:
                 continue
-            label = self._clean(re.sub(r"[●○•\.\-]+", " ", m.group(1)))
+            label = self._clean(_BULLETS.sub(" ", m.group(1)))
             score = int(m.group(2))
             if label:
                 ratings[label] = score
         return ratings
 
+    @staticmethod
+    def _dekalb_links(html: str, base_url: str) -> set[str]:
+        try:
+            tree = lxml.html.fromstring(html.encode("utf-8"), parser=_HTML_PARSER)
+        except lxml.etree.ParserError:
+            return set()
+        tree.make_links_absolute(base_url, handle_failures="discard")
+        return {href.split("?")[0].split("#")[0] for href in _DEKALB_HREFS(tree)}
+
     def discover_catalog_pages(self) -> list[str]:
         html = self.fetch(self.start_url)
-        soup = BeautifulSoup(html, "html.parser")
-        found: set[str] = set()
-        for a in soup.select("a[href]"):
-            href = a.get("href", "")
-            full = urljoin(self.start_url, href)
-            parsed = urlparse(full)
-            if parsed.netloc != "www.cropscience.bayer.ua":
-                continue
-            if "/Products/Dekalb/" not in parsed.path:
-                continue
-            if parsed.path.rstrip("/") == "/Products/Dekalb":
-                continue
-            if parsed.path.count("/") == 3:
-                found.add(full.split("?")[0])
-        return sorted(found)
+        return sorted(u for u in self._dekalb_links(html, self.start_url) if _CATALOG_URL.match(u))
 
     def discover_product_pages(self, catalog_url: str) -> list[str]:
         html = self.fetch(catalog_url)
-        soup = BeautifulSoup(html, "html.parser")
-        found: set[str] = set()
-        path_prefix = urlparse(catalog_url).path.rstrip("/") + "/"
-        for a in soup.select("a[href]"):
-            href = a.get("href", "")
-            full = urljoin(catalog_url, href).split("?")[0]
-            parsed = urlparse(full)
-            if parsed.netloc != "www.cropscience.bayer.ua":
-                continue
-            if not parsed.path.startswith(path_prefix):
-                continue
-            if parsed.path.rstrip("/") == path_prefix.rstrip("/"):
-                continue
-            if parsed.path.count("/") >= 4:
-                found.add(full)
-        return sorted(found)
+        pattern = _product_url_pattern(urlparse(catalog_url).path.rstrip("/") + "/")
+        return sorted(u for u in self._dekalb_links(html, catalog_url) if pattern.match(u))
 
     def parse_product(self, product_url: str) -> dict[str, Any]:
         html = self.fetch(product_url)
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, "lxml")
 
         h1 = soup.find("h1")
         name = self._clean(h1.get_text(" ", strip=True)) if h1 else None
 
-        text = soup.get_text("\n", strip=True).replace("\u00a0", " ")
-        text = re.sub(r"\n{2,}", "\n", text).strip()
+        text = _BLANK_LINES.sub("\n", soup.get_text("\n", strip=True).translate(_NBSP_TRANS)).strip()
 
-        fao = self._find_first(r"ФАО:\s*([0-9]{2,4})", text)
-        grain_type = self._find_first(r"Тип зерна:\s*([^\n]+)", text)
-        maturity = self._find_first(r"Група стиглості:\s*([^\n]+)", text)
+        fao = self._find_first(_FAO, text)
+        grain_type = self._find_first(_GRAIN_TYPE, text)
+        maturity = self._find_first(_MATURITY, text)
 
         advantages = self._find_block("ОСНОВНІ ПЕРЕВАГИ", text)
         positioning = self._find_block("ПОЗИЦІОНУВАННЯ ГІБРИДА", text)
@@ -129,11 +209,8 @@ class BayerUADekalbScraper:
         density_kv = self._parse_kv_lines(density) if density else {}
         ratings = self._parse_ratings(characteristics) if characteristics else {}
 
-        crop = None
-        try:
-            crop = product_url.split("/Products/Dekalb/")[1].split("/")[0].lower()
-        except Exception:
-            crop = None
+        _, _, tail = product_url.partition("/Products/Dekalb/")
+        crop = tail.partition("/")[0].lower() or None
 
         item: dict[str, Any] = {
             "market": self.market,
@@ -178,13 +255,15 @@ class BayerUADekalbScraper:
     def run(self) -> dict[str, Any]:
         catalog_urls = self.discover_catalog_pages()
         product_urls: set[str] = set()
-        for catalog_url in catalog_urls:
-            product_urls.update(self.discover_product_pages(catalog_url))
-
         items: list[dict[str, Any]] = []
-        for product_url in sorted(product_urls):
-            item = self.parse_product(product_url)
-            if item.get("name"):
-                items.append(item)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for urls in pool.map(self.discover_product_pages, catalog_urls):
+                product_urls.update(urls)
+            for item in pool.map(self.parse_product, sorted(product_urls)):
+                if item.get("name"):
+                    items.append(item)
+        finally:
+            pool.shutdown(cancel_futures=True)
 
         return {"catalog_urls": catalog_urls, "product_urls": sorted(product_urls), "items": items}
@@ -0,0 +1,16 @@
+import queue
+import threading
+
+import pytest
+
+from backend import main
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(main, "DB_PATH", tmp_path / "catalog.db")
+    monkeypatch.setattr(main, "FALLBACK_PATH", tmp_path / "catalog_fallback.json")
+    monkeypatch.setattr(main, "_TLS", threading.local())
+    monkeypatch.setattr(main, "_CONN_POOL", queue.Queue(maxsize=main.CATALOG_CONN_POOL_SIZE))
+    return tmp_path / "catalog.db"
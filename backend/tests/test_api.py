@@ -1,5 +1,7 @@
+import orjson
 from fastapi.testclient import TestClient
 
+from backend import main
 from backend.main import app
 
 
@@ -20,3 +22,45 @@ def test_catalog_endpoints():
     sources = client.get('/api/catalog/sources')
     assert sources.status_code == 200
     assert 'sources' in sources.json()
+
+
+def test_catalog_stream_matches_read_catalog(db, monkeypatch):
+    monkeypatch.setattr(main, 'CATALOG_STREAM_BATCH', 2)
+    monkeypatch.setattr(main, 'CATALOG_STREAM_CHUNK', 64)
+    main.init_db()
+    items = [
+        {
+            'crop': crop,
+            'name': name,
+            'market': 'UA',
+            'source_url': f'https://example.com/{crop}/{name}',
+            'attributes': [{'key': f'k{i}', 'value': i, 'evidence': f'k{i} {i}'} for i in range(n_attrs)],
+        }
+        for crop, name, n_attrs in [
+            ('corn', 'DKC 3730', 3),
+            ('corn', 'DKC 4014', 0),
+            ('corn', 'DKC 3511', 1),
+            ('sunflower', 'DKS 4100', 2),
+            ('rapeseed', 'DK Exception', 0),
+        ]
+    ]
+    main.upsert_items(items)
+
+    conn = main._borrow_conn()
+    chunks = list(main.stream_catalog(conn, conn.execute(main.CATALOG_QUERY)))
+    assert len(chunks) > 1
+    assert orjson.loads(b''.join(chunks)) == main.read_catalog()
+
+    client = TestClient(main.app)
+    catalog = client.get('/api/catalog')
+    assert catalog.headers['content-type'] == 'application/json'
+    assert catalog.json() == main.read_catalog()
+    assert [h['attributes'] for h in catalog.json()['crops']['rapeseed']] == [[]]
+    assert set(catalog.json()['crops']) == {'corn', 'sunflower', 'rapeseed'}
+
+
+def test_catalog_database_error_returns_500(db):
+    client = TestClient(main.app, raise_server_exceptions=False)
+    catalog = client.get('/api/catalog')
+    assert catalog.status_code == 500
+    assert main._CONN_POOL.qsize() == 1
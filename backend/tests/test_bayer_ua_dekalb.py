@@ -1,3 +1,8 @@
+import threading
+import time
+
+import pytest
+
 from backend.scrapers.bayer_ua_dekalb import BayerUADekalbScraper
 
 
@@ -33,3 +38,175 @@ def test_parse_product_extracts_expected_fields():
         assert entry["selector"] == "regex_on_page_text"
         assert entry["source_url"].startswith("https://www.cropscience.bayer.ua/Products/Dekalb/")
         assert entry["evidence"]
+
+
+class StubResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class StubSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_fetch_revalidates_cached_page_with_etag(tmp_path):
+    url = "https://www.cropscience.bayer.ua/Products/Dekalb/Corn"
+    scraper = BayerUADekalbScraper(cache_path=tmp_path / "http_cache.db", min_delay=0, max_delay=0)
+    session = StubSession(
+        [
+            StubResponse(200, "ДКС 3747".encode("utf-8"), {"ETag": '"v1"'}),
+            StubResponse(304),
+        ]
+    )
+    scraper._session = session
+
+    assert scraper.fetch(url) == "ДКС 3747"
+    assert scraper.fetch(url) == "ДКС 3747"
+    assert "If-None-Match" not in session.requests[0][1]
+    assert session.requests[1][1]["If-None-Match"] == '"v1"'
+    scraper.close()
+
+
+def test_fetch_does_not_cache_response_without_validators(tmp_path):
+    url = "https://www.cropscience.bayer.ua/Products/Dekalb/Corn"
+    scraper = BayerUADekalbScraper(cache_path=tmp_path / "http_cache.db", min_delay=0, max_delay=0)
+    session = StubSession(
+        [
+            StubResponse(200, b"cached", {"ETag": '"v1"'}),
+            StubResponse(200, b"first"),
+            StubResponse(200, b"second"),
+        ]
+    )
+    scraper._session = session
+
+    assert scraper.fetch(url) == "cached"
+    assert scraper.fetch(url) == "first"
+    assert session.requests[1][1]["If-None-Match"] == '"v1"'
+    assert scraper.fetch(url) == "second"
+    assert session.requests[2][1] == {}
+    scraper.close()
+
+
+def test_discover_catalog_pages_filters_links():
+    html = """
+    <html><body>
+      <a href="/Products/Dekalb/Corn">corn</a>
+      <a href="/Products/Dekalb/Rapeseed?tab=1">rapeseed</a>
+      <a href="https://www.cropscience.bayer.ua/Products/Dekalb/Sorghum#top">sorghum</a>
+      <a href="Dekalb/Sunflower">relative</a>
+      <a href="/Products/Dekalb/Soy/">trailing slash</a>
+      <a href="/Products/Dekalb">self</a>
+      <a href="/Products/Dekalb/Corn/DKC3730">product</a>
+      <a href="https://example.com/Products/Dekalb/Wheat">off-site</a>
+      <a href="/Products/Other/Corn">other brand</a>
+    </body></html>
+    """
+    scraper = BayerUADekalbScraper()
+    scraper.fetch = lambda _: html
+
+    assert scraper.discover_catalog_pages() == [
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Corn",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Rapeseed",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Sorghum",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Sunflower",
+    ]
+
+
+def test_discover_product_pages_filters_links():
+    html = """
+    <html><body>
+      <a href="/Products/Dekalb/Corn/DKC3730">absolute path</a>
+      <a href="Corn/DKC4014">relative</a>
+      <a href="/Products/Dekalb/Corn/DKC5050?x=1">query</a>
+      <a href="/Products/Dekalb/Corn/DKC6060#specs">fragment</a>
+      <a href="/Products/Dekalb/Corn">self</a>
+      <a href="/Products/Dekalb/Corn/">self with slash</a>
+      <a href="/Products/Dekalb">root</a>
+      <a href="/Products/Dekalb/Cornish/DKC9">sibling prefix</a>
+      <a href="https://example.com/Products/Dekalb/Corn/DKC1">off-site</a>
+    </body></html>
+    """
+    scraper = BayerUADekalbScraper()
+    scraper.fetch = lambda _: html
+
+    assert scraper.discover_product_pages("https://www.cropscience.bayer.ua/Products/Dekalb/Corn") == [
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC3730",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC4014",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC5050",
+        "https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC6060",
+    ]
+
+
+def test_discover_pages_tolerates_unusual_documents():
+    scraper = BayerUADekalbScraper()
+
+    scraper.fetch = lambda _: '<?xml version="1.0" encoding="utf-8"?><html><a href="/Products/Dekalb/Corn">x</a></html>'
+    assert scraper.discover_catalog_pages() == ["https://www.cropscience.bayer.ua/Products/Dekalb/Corn"]
+
+    for body in ["", "   \n", "<!-- empty -->"]:
+        scraper.fetch = lambda _, body=body: body
+        assert scraper.discover_catalog_pages() == []
+        assert scraper.discover_product_pages("https://www.cropscience.bayer.ua/Products/Dekalb/Corn") == []
+
+
+def test_fetch_limits_concurrent_requests_per_host():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    class CountingSession(StubSession):
+        def get(self, url, headers=None, timeout=None):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+            return StubResponse(200, b"ok")
+
+    scraper = BayerUADekalbScraper(max_workers=6, max_per_host=2, min_delay=0, max_delay=0)
+    scraper._session = CountingSession([])
+    urls = [f"https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC{i}" for i in range(12)]
+    scraper.discover_product_pages = lambda _: urls
+    scraper.discover_catalog_pages = lambda: ["https://www.cropscience.bayer.ua/Products/Dekalb/Corn"]
+    scraper.parse_product = lambda url: {"name": scraper.fetch(url)}
+
+    assert len(scraper.run()["items"]) == 12
+    assert peak == 2
+
+
+def test_run_stops_fetching_after_a_failure():
+    fetched = []
+
+    def parse_product(url):
+        fetched.append(url)
+        if url.endswith("DKC00"):
+            raise RuntimeError("boom")
+        time.sleep(0.05)
+        return {"name": url}
+
+    scraper = BayerUADekalbScraper(max_workers=1)
+    urls = [f"https://www.cropscience.bayer.ua/Products/Dekalb/Corn/DKC{i:02d}" for i in range(20)]
+    scraper.discover_catalog_pages = lambda: ["https://www.cropscience.bayer.ua/Products/Dekalb/Corn"]
+    scraper.discover_product_pages = lambda _: urls
+    scraper.parse_product = parse_product
+
+    with pytest.raises(RuntimeError):
+        scraper.run()
+    assert len(fetched) < 5
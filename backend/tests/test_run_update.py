@@ -0,0 +1,88 @@
+import orjson
+import pytest
+
+from backend import main
+
+
+@pytest.fixture
+def job(db, monkeypatch):
+    main.init_db()
+    clock = [1000.0]
+    persisted = []
+    persist_run = main.persist_run
+
+    def record(job_id, run):
+        persisted.append((len(run["step_logs"]), run["status"]))
+        persist_run(job_id, run)
+
+    monkeypatch.setattr(main.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(main, "persist_run", record)
+    job_id = "job-1"
+    main.RUNS[job_id] = {
+        "status": "running",
+        "step_logs": [],
+        "started_at": main.utc_now(),
+        "finished_at": None,
+        "counts": {"discovered": 0, "parsed": 0, "added": 0, "updated": 0, "unchanged": 0, "errors": 0},
+    }
+    yield job_id, clock, persisted
+    main.RUNS.pop(job_id, None)
+
+
+def stored_logs(job_id):
+    with main.get_conn() as conn:
+        row = conn.execute("SELECT status, logs_json FROM runs WHERE job_id=?", (job_id,)).fetchone()
+    return row["status"], [entry["message"] for entry in orjson.loads(row["logs_json"])]
+
+
+def test_log_burst_persists_every_n_lines_and_flushes_on_exit(job, monkeypatch):
+    job_id, _, persisted = job
+    monkeypatch.setattr(main, "RUN_PERSIST_EVERY", 4)
+    disabled = [
+        main.SourceStatus(id=f"src_{i}", market="UA", enabled=False, reason="off", last_run=None, fields=[])
+        for i in range(10)
+    ]
+    monkeypatch.setattr(main, "source_registry", lambda: disabled)
+
+    main.run_update(job_id, main.UpdateRequest(sources=[s.id for s in disabled]))
+
+    assert persisted == [(1, "running"), (5, "running"), (9, "running"), (12, "completed")]
+    status, messages = stored_logs(job_id)
+    assert status == "completed"
+    assert messages == [entry["message"] for entry in main.RUNS[job_id]["step_logs"]]
+    assert len(messages) == 12
+
+
+def test_log_persists_after_interval_and_flushes_on_completion(job, monkeypatch):
+    job_id, clock, persisted = job
+
+    class FakeScraper:
+        def __init__(self, **kwargs):
+            pass
+
+        def run(self):
+            clock[0] += main.RUN_PERSIST_INTERVAL
+            return {
+                "catalog_urls": ["c"],
+                "product_urls": ["p"],
+                "items": [{"crop": "corn", "name": "DKC 3730", "market": "UA", "source_url": "p", "attributes": []}],
+            }
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(main, "BayerUADekalbScraper", FakeScraper)
+
+    main.run_update(job_id, main.UpdateRequest(sources=["bayer_ua_dekalb"]))
+
+    assert persisted == [(1, "running"), (3, "running"), (6, "completed")]
+    status, messages = stored_logs(job_id)
+    assert status == "completed"
+    assert messages == [
+        "Starting catalog sync job.",
+        "Fetching bayer_ua_dekalb start page.",
+        "Discovered catalog pages: 1",
+        "Discovered product pages: 1",
+        "Parsed products: 1",
+        "DB changes: added=1 updated=0 unchanged=0",
+    ]
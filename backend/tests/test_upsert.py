@@ -0,0 +1,86 @@
+import hashlib
+import sqlite3
+
+from backend import main
+
+
+def make_item(name, fao="260"):
+    return {
+        "crop": "corn",
+        "name": name,
+        "market": "UA",
+        "source_url": f"https://example.com/{name}",
+        "attributes": [
+            {"key": "fao", "value": fao, "evidence": f"ФАО: {fao}"},
+            {"key": "rating.Холодостійкість", "value": 9, "evidence": "Холодостійкість 9"},
+        ],
+    }
+
+
+def seed_legacy_db(path, content_hash=None):
+    conn = sqlite3.connect(path)
+    hash_column = "content_hash TEXT," if content_hash is not None else ""
+    conn.executescript(
+        f"""
+        CREATE TABLE hybrids(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          crop TEXT NOT NULL,
+          name TEXT NOT NULL,
+          brand TEXT,
+          market TEXT NOT NULL,
+          source_url TEXT NOT NULL,
+          last_seen TEXT NOT NULL,
+          last_updated TEXT NOT NULL,
+          {hash_column}
+          UNIQUE(name, market, source_url)
+        );
+        CREATE TABLE attributes(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          hybrid_id INTEGER NOT NULL,
+          key TEXT NOT NULL,
+          value TEXT,
+          evidence TEXT,
+          evidence_hash TEXT,
+          selector TEXT,
+          source_url TEXT NOT NULL,
+          extracted_at TEXT NOT NULL
+        );
+        """
+    )
+    item = make_item("DKC 3730")
+    columns = "crop, name, brand, market, source_url, last_seen, last_updated"
+    values = [item["crop"], item["name"], None, item["market"], item["source_url"], "t0", "t0"]
+    if content_hash is not None:
+        columns += ", content_hash"
+        values.append(content_hash)
+    hybrid_id = conn.execute(
+        f"INSERT INTO hybrids({columns}) VALUES({','.join('?' * len(values))})", values
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO attributes(hybrid_id, key, value, evidence, source_url, extracted_at) VALUES(?,?,?,?,?,?)",
+        [(hybrid_id, a["key"], a["value"], a["evidence"], item["source_url"], "t0") for a in item["attributes"]],
+    )
+    conn.commit()
+    conn.close()
+
+
+def assert_upsert_counts_after_migration():
+    main.init_db()
+    assert main.upsert_items([make_item("DKC 3730")]) == {"added": 0, "updated": 0, "unchanged": 1}
+    assert main.upsert_items([make_item("DKC 3730", fao="280")]) == {"added": 0, "updated": 1, "unchanged": 0}
+    assert main.upsert_items([make_item("DKC 4014")]) == {"added": 1, "updated": 0, "unchanged": 0}
+    assert main.upsert_items([make_item("DKC 3730", fao="280"), make_item("DKC 4014")]) == {
+        "added": 0,
+        "updated": 0,
+        "unchanged": 2,
+    }
+
+
+def test_init_db_backfills_missing_content_hash(db):
+    seed_legacy_db(db)
+    assert_upsert_counts_after_migration()
+
+
+def test_init_db_rehashes_legacy_sha256_content_hash(db):
+    seed_legacy_db(db, content_hash=hashlib.sha256(b"legacy").hexdigest())
+    assert_upsert_counts_after_migration()